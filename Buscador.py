@@ -3,8 +3,10 @@ import pickle
 import csv
 import time
 import os
-import math
-from collections import defaultdict
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import csr_matrix
 
 class Buscador:
     """
@@ -22,10 +24,12 @@ class Buscador:
         self.arquivo_modelo = ""
         self.arquivo_consultas = ""
         self.arquivo_resultados = ""
+        self.top_k = None # Número máximo de documentos por ranking (instrução opcional TOPK); None mantém o ranking completo
         
         # Estruturas de dados
-        self.modelo_tfidf = None
-        self.normas_documentos = None
+        self.modelo_tfidf = None # Matriz esparsa CSR (termos x documentos) com os pesos TF-IDF, colunas normalizadas
+        self.termo_para_linha = None
+        self.doc_ids = None
         self.consultas = {}
         self.resultados_finais = {}
 
@@ -56,13 +60,20 @@ class Buscador:
                         self.arquivo_consultas = valor
                     elif chave.upper() == 'RESULTADOS':
                         self.arquivo_resultados = valor
+                    elif chave.upper() == 'TOPK':
+                        self.top_k = int(valor)
             
             if not all([self.arquivo_modelo, self.arquivo_consultas, self.arquivo_resultados]):
                 raise ValueError("Arquivo de configuração incompleto. Instruções MODELO, CONSULTAS e RESULTADOS são obrigatórias.")
 
+            if self.top_k is not None and self.top_k <= 0:
+                raise ValueError("A instrução TOPK deve ser um inteiro positivo.")
+
             self.logger.info(f"Arquivo do modelo: {self.arquivo_modelo}")
             self.logger.info(f"Arquivo de consultas: {self.arquivo_consultas}")
             self.logger.info(f"Arquivo de resultados: {self.arquivo_resultados}")
+            if self.top_k is not None:
+                self.logger.info(f"Tamanho máximo dos rankings (TOPK): {self.top_k}")
 
         except FileNotFoundError:
             self.logger.error(f"Arquivo de configuração '{self.config_path}' não encontrado.")
@@ -75,10 +86,11 @@ class Buscador:
         """Carrega o arquivo de modelo (.pkl) em memória."""
         self.logger.info(f"Carregando modelo de '{self.arquivo_modelo}'...")
         try:
-            with open(self.arquivo_modelo, 'rb') as f:
+            with open(self.arquivo_modelo, 'rb', buffering=1 << 20) as f:
                 modelo_completo = pickle.load(f)
                 self.modelo_tfidf = modelo_completo['modelo_tfidf']
-                self.normas_documentos = modelo_completo['normas_documentos']
+                self.termo_para_linha = modelo_completo['termo_para_linha']
+                self.doc_ids = modelo_completo['doc_ids']
             self.logger.info("Modelo carregado com sucesso.")
         except FileNotFoundError:
             self.logger.error(f"Arquivo de modelo '{self.arquivo_modelo}' não encontrado.")
@@ -107,50 +119,109 @@ class Buscador:
 
     def _realizar_buscas(self):
         """
-        Executa cada consulta contra o modelo, calcula a similaridade de cosseno
-        e armazena os resultados ranqueados.
+        Executa todas as consultas contra o modelo de uma só vez, calcula a similaridade
+        de cosseno e armazena os resultados ranqueados.
+        As consultas são empilhadas em uma matriz esparsa Q (consultas x termos), e os
+        scores de todas elas são obtidos com um único produto Q @ modelo (consultas x documentos).
         """
         self.logger.info("Iniciando a execução das buscas...")
         
+        num_termos = self.modelo_tfidf.shape[0]
+
+        # Cada consulta não vazia ocupa uma linha de Q, na ordem em que foi lida
+        query_nums = []
+        normas_quadradas_consulta = []
+        linhas = []
+        colunas = []
+        pesos = []
         for query_num, query_text in self.consultas.items():
             # CORREÇÃO: Removemos o .lower() pois os termos no modelo e na consulta já estão em maiúsculas.
-            termos_consulta = query_text.split()
+            # Cada ocorrência de uma palavra na consulta tem peso 1, logo o peso do termo é sua contagem
+            contagem_termos = Counter(query_text.split())
             
-            # Dicionário para armazenar o score de cada documento para esta consulta
-            scores_docs = defaultdict(float)
-            
-            # Cada palavra na consulta tem peso 1
-            norma_consulta = math.sqrt(len(termos_consulta))
-            
-            if norma_consulta == 0:
+            if not contagem_termos:
                 continue # Pula consultas vazias
 
-            # Calcula o produto escalar (numerador da similaridade de cosseno)
-            for termo in termos_consulta:
-                if termo in self.modelo_tfidf:
-                    for doc_id, peso in self.modelo_tfidf[termo].items():
-                        # O peso do termo na consulta é 1
-                        scores_docs[doc_id] += peso * 1
-            
-            # Calcula a similaridade de cosseno final para cada documento
-            for doc_id in scores_docs:
-                norma_doc = self.normas_documentos.get(doc_id, 1)
-                if norma_doc > 0:
-                    scores_docs[doc_id] /= (norma_doc * norma_consulta)
-
-            # Ordena os documentos pelo score em ordem decrescente
-            docs_ranqueados = sorted(scores_docs.items(), key=lambda item: item[1], reverse=True)
-            
-            # Formata a saída conforme especificado: lista de ternos (posição, doc, score)
-            resultado_formatado = []
-            for i, (doc_id, score) in enumerate(docs_ranqueados):
-                posicao = i + 1
-                resultado_formatado.append((posicao, doc_id, score))
+            # Uma única busca no vocabulário por termo distinto; termos ausentes do modelo são descartados
+            linha = len(query_nums)
+            for termo, contagem in contagem_termos.items():
+                coluna = self.termo_para_linha.get(termo)
+                if coluna is not None:
+                    linhas.append(linha)
+                    colunas.append(coluna)
+                    pesos.append(contagem)
+
+            query_nums.append(query_num)
+            # CORREÇÃO: a norma do vetor da consulta considera o peso (contagem) de cada termo,
+            # e não apenas o número de palavras, que diverge quando há termos repetidos
+            normas_quadradas_consulta.append(sum(contagem * contagem for contagem in contagem_termos.values()))
+
+        # Raízes quadradas de todas as normas calculadas de uma só vez
+        normas_consulta = np.sqrt(np.array(normas_quadradas_consulta, dtype=np.float64))
+
+        matriz_consultas = csr_matrix(
+            (np.array(pesos, dtype=np.float32), (linhas, colunas)),
+            shape=(len(query_nums), num_termos)
+        )
+
+        # Produto escalar (numerador da similaridade de cosseno) entre todas as consultas e todos os documentos
+        scores = (matriz_consultas @ self.modelo_tfidf).tocsr()
+        scores.sort_indices()
+
+        # Pesos nulos (termos com idf 0) não contribuem para o produto, e o SpMM descarta os documentos
+        # cujo score total é 0; eles são recolocados para que apareçam no ranking com score 0.0
+        if not np.all(self.modelo_tfidf.data):
+            scores = self._incluir_scores_nulos(matriz_consultas, scores)
+
+        # Os vetores dos documentos já são unitários: basta dividir cada linha pela norma da sua consulta
+        scores.data /= np.repeat(normas_consulta, np.diff(scores.indptr))
+
+        for i, query_num in enumerate(query_nums):
+            # Documentos que compartilham algum termo com a consulta i, em ordem de coluna
+            inicio, fim = scores.indptr[i], scores.indptr[i + 1]
+            docs_pontuados = scores.indices[inicio:fim]
+            scores_consulta = scores.data[inicio:fim]
+
+            # Se houver TOPK, seleciona apenas os k melhores documentos
+            if self.top_k is not None and self.top_k < docs_pontuados.size:
+                k = self.top_k
+                melhores = np.argpartition(-scores_consulta, k - 1)[:k]
+                docs_pontuados = docs_pontuados[melhores]
+                scores_consulta = scores_consulta[melhores]
+
+            # Ordena apenas os documentos selecionados pelo score em ordem decrescente
+            ordem = np.argsort(-scores_consulta, kind='stable')
             
-            self.resultados_finais[query_num] = resultado_formatado
+            # Guarda os doc_ids e scores já ordenados; a posição é implícita na ordem dos arrays
+            self.resultados_finais[query_num] = (self.doc_ids[docs_pontuados[ordem]], scores_consulta[ordem])
 
         self.logger.info("Execução das buscas concluída.")
 
+    def _incluir_scores_nulos(self, matriz_consultas, scores):
+        """
+        Completa a matriz de scores com os documentos que compartilham termos com a consulta
+        mas cujos pesos são todos nulos, atribuindo a eles score 0.
+
+        :param matriz_consultas: Matriz esparsa Q (consultas x termos) com os pesos das consultas.
+        :param scores: Matriz CSR (consultas x documentos) com índices ordenados, resultado de Q @ modelo.
+        :return: Matriz CSR com a estrutura de todos os pares (consulta, documento) com termos em comum.
+        """
+        # Mesmo produto, mas com todos os pesos do modelo iguais a 1: revela todos os documentos alcançados
+        padrao_modelo = self.modelo_tfidf.copy()
+        padrao_modelo.data = np.ones_like(padrao_modelo.data)
+        ocorrencias = (matriz_consultas @ padrao_modelo).tocsr()
+        ocorrencias.sort_indices()
+
+        # Com linhas e colunas ordenadas, a chave (linha, coluna) de cada elemento cresce monotonicamente,
+        # e os scores calculados são posicionados na estrutura completa por busca binária
+        num_documentos = scores.shape[1]
+        def chaves(matriz):
+            linhas = np.repeat(np.arange(matriz.shape[0], dtype=np.int64), np.diff(matriz.indptr))
+            return linhas * num_documentos + matriz.indices
+        data = np.zeros(ocorrencias.nnz, dtype=scores.dtype)
+        data[np.searchsorted(chaves(ocorrencias), chaves(scores))] = scores.data
+        return csr_matrix((data, ocorrencias.indices, ocorrencias.indptr), shape=scores.shape)
+
     def _escrever_resultados(self):
         """Escreve os resultados ranqueados em um arquivo CSV."""
         if not self.resultados_finais:
@@ -169,9 +240,15 @@ class Buscador:
                 writer = csv.writer(f, delimiter=';')
                 writer.writerow(['QueryNumber', 'Results'])
                 
-                for query_num, ranking in sorted(self.resultados_finais.items()):
-                    # Converte a lista de ternos para sua representação em string
-                    writer.writerow([query_num, str(ranking)])
+                for query_num, (doc_ids, scores) in sorted(self.resultados_finais.items()):
+                    # Formata a saída conforme especificado: lista de ternos (posição, doc, score).
+                    # Cada terno é formatado diretamente, sem criar tuplas intermediárias. Os scores são
+                    # float32 e str() os escreve com os dígitos que essa precisão de fato representa.
+                    ternos = ', '.join(
+                        f'({posicao}, {doc_id}, {score})'
+                        for posicao, doc_id, score in zip(range(1, doc_ids.size + 1), doc_ids.tolist(), map(str, scores))
+                    )
+                    writer.writerow([query_num, f'[{ternos}]'])
             
             self.logger.info("Arquivo de resultados salvo com sucesso.")
         except Exception as e:
@@ -5,13 +5,59 @@ import re
 import csv
 import time
 import os
-from collections import defaultdict
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict, Counter
+from functools import lru_cache
+
+import numpy as np
+
+# Todas as marcas combinantes (categoria 'Mn'), levantadas uma única vez na importação do módulo
+_MARCAS_COMBINANTES = [codigo for codigo in range(sys.maxunicode + 1) if unicodedata.category(chr(codigo)) == 'Mn']
+
+def _construir_tabela_acentos():
+    """
+    Monta a tabela de tradução usada para remover acentos: cada letra latina acentuada
+    é mapeada para sua forma sem marcas diacríticas (equivalente a NFD + remoção das
+    marcas 'Mn') e todas as marcas combinantes avulsas são apagadas.
+    """
+    tabela = {}
+    for codigo in [*range(0xC0, 0x250), *range(0x1E00, 0x1F00)]:
+        decomposto = unicodedata.normalize('NFD', chr(codigo))
+        if decomposto != chr(codigo):
+            tabela[codigo] = ''.join(c for c in decomposto if unicodedata.category(c) != 'Mn')
+    for codigo in _MARCAS_COMBINANTES:
+        tabela[codigo] = None
+    return str.maketrans(tabela)
+
+def _classe_marcas_combinantes():
+    """
+    Monta o conteúdo de uma classe de caracteres de regex com todas as marcas combinantes,
+    agrupando os códigos consecutivos em intervalos.
+    """
+    intervalos = []
+    for codigo in _MARCAS_COMBINANTES:
+        if intervalos and intervalos[-1][1] == codigo - 1:
+            intervalos[-1][1] = codigo
+        else:
+            intervalos.append([codigo, codigo])
+    return ''.join(f'\\U{inicio:08x}-\\U{fim:08x}' for inicio, fim in intervalos)
+
+def _novo_array_postings():
+    """Cria o array de inteiros C ('i') que armazena os pares (doc_id, frequência) de uma palavra."""
+    return array('i')
 
 class GeradorListaInvertida:
     """
     Classe responsável por gerar uma lista invertida a partir de uma coleção de
     documentos em formato XML, conforme especificado no trabalho.
     """
+    # Expressões regulares e tabela de acentos compiladas uma única vez para todos os documentos
+    _RE_TOKEN = re.compile(f'[\\w{_classe_marcas_combinantes()}]+') # Sequências de caracteres de palavra, incluindo marcas combinantes
+    _RE_PALAVRA = re.compile(r'[a-z]{2,}') # Apenas palavras com 2 letras ou mais
+    _TABELA_ACENTOS = _construir_tabela_acentos()
+
     def __init__(self, config_path="GLI.CFG"):
         """
         Inicializa o gerador.
@@ -21,8 +67,9 @@ class GeradorListaInvertida:
         self.config_path = config_path
         self.arquivos_leitura = []
         self.arquivo_escrita = "resultados\lista_invertida.csv"
-        # Usar defaultdict(list) simplifica a adição de novos documentos a uma palavra
-        self.lista_invertida = defaultdict(list)
+        # Cada palavra guarda um array de inteiros C com pares intercalados
+        # [doc_id, frequência, doc_id, frequência, ...], bem mais compacto que uma lista de objetos Python.
+        self.lista_invertida = defaultdict(_novo_array_postings)
         
         # Configuração do logging conforme especificado no documento
         self.logger = logging.getLogger('GeradorListaInvertida')
@@ -68,73 +115,69 @@ class GeradorListaInvertida:
             self.logger.error(f"Erro ao ler arquivo de configuração: {e}")
             raise
 
-    def _normalizar_palavra(self, texto):
+    @classmethod
+    def _normalizar_palavra(cls, texto):
         """
         Normaliza o texto: remove acentos, converte para minúsculas,
         remove caracteres não alfabéticos e retorna uma lista de palavras (tokens).
         As regras de normalização do Indexador são aplicadas aqui para consistência.
         """
-        # Converte para minúsculas
-        texto = texto.lower()
-        # Remove acentos
-        texto_sem_acentos = ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
-        # Mantém apenas letras e espaços, e quebra em palavras
-        palavras = re.findall(r'\b[a-z]{2,}\b', texto_sem_acentos) # Apenas palavras com 2 letras ou mais
+        # Quebra o texto em tokens e normaliza cada um; tokens repetidos são resolvidos pelo cache
+        tokens = cls._RE_TOKEN.findall(texto)
+        palavras = [palavra for palavra in map(cls._normalizar_token, tokens) if palavra]
         return palavras
 
+    @staticmethod
+    @lru_cache(maxsize=200_000)
+    def _normalizar_token(token):
+        """
+        Converte um token para minúsculas e remove seus acentos. Como o vocabulário de uma
+        coleção se repete muito, o resultado é memorizado por token.
+
+        :return: A palavra normalizada, ou None se ela não for formada apenas por 2 ou mais letras de a-z.
+        """
+        palavra = token.lower().translate(GeradorListaInvertida._TABELA_ACENTOS)
+        return palavra if GeradorListaInvertida._RE_PALAVRA.fullmatch(palavra) else None
+
     def _processar_arquivos(self):
         """
         Processa os arquivos XML, extrai os textos e monta a lista invertida.
+        Cada arquivo é processado em um processo separado e as listas invertidas
+        parciais são combinadas na ordem dos arquivos de entrada.
         """
         self.logger.info("Iniciando processamento dos arquivos XML.")
         total_documentos_processados = 0
         
-        for caminho_arquivo in self.arquivos_leitura:
-            try:
-                self.logger.info(f"Processando arquivo: {caminho_arquivo}")
-                tree = ET.parse(caminho_arquivo)
-                root = tree.getroot()
-                
-                for record in root.findall('RECORD'):
-                    record_num_element = record.find('RECORDNUM')
-                    if record_num_element is None:
-                        continue
-                    
-                    record_num = int(record_num_element.text.strip())
-                    
-                    texto = ""
-                    abstract_element = record.find('ABSTRACT')
-                    if abstract_element is not None and abstract_element.text:
-                        texto = abstract_element.text
-                    else:
-                        extract_element = record.find('EXTRACT') # Se não houver ABSTRACT, usa EXTRACT
-                        if extract_element is not None and extract_element.text:
-                            texto = extract_element.text
-                        else:
-                            self.logger.warning(f"Documento {record_num} não contém ABSTRACT nem EXTRACT.")
-                            continue # Pula para o próximo registro
-                    
-                    palavras_normalizadas = self._normalizar_palavra(texto)
-                    
-                    for palavra in palavras_normalizadas:
-                        # Adiciona o número do documento à lista daquela palavra.
-                        # Se uma palavra aparece várias vezes, o número do doc é adicionado várias vezes.
-                        self.lista_invertida[palavra].append(record_num)
+        num_processos = min(len(self.arquivos_leitura), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=num_processos) as executor:
+            futuros = [(caminho, executor.submit(_processar_arquivo, caminho)) for caminho in self.arquivos_leitura]
+
+            for caminho_arquivo, futuro in futuros:
+                try:
+                    self.logger.info(f"Processando arquivo: {caminho_arquivo}")
+                    lista_parcial, num_documentos, docs_sem_texto = futuro.result()
+
+                    for record_num in docs_sem_texto:
+                        self.logger.warning(f"Documento {record_num} não contém ABSTRACT nem EXTRACT.")
+
+                    for palavra, postings in lista_parcial.items():
+                        self.lista_invertida[palavra].extend(postings)
                     
-                    total_documentos_processados += 1
+                    total_documentos_processados += num_documentos
 
-            except ET.ParseError as e:
-                self.logger.error(f"Erro de parsing no XML '{caminho_arquivo}': {e}")
-            except Exception as e:
-                self.logger.error(f"Erro inesperado ao processar '{caminho_arquivo}': {e}")
+                except ET.ParseError as e:
+                    self.logger.error(f"Erro de parsing no XML '{caminho_arquivo}': {e}")
+                except Exception as e:
+                    self.logger.error(f"Erro inesperado ao processar '{caminho_arquivo}': {e}")
         
         self.logger.info(f"Total de documentos processados: {total_documentos_processados}")
         self.logger.info(f"Número de palavras únicas na lista invertida: {len(self.lista_invertida)}")
 
     def _escrever_saida(self):
         """
-        Escreve o conteúdo da lista invertida em um arquivo CSV.
-        O caractere de separação será o ";".
+        Escreve o conteúdo da lista invertida no arquivo de saída.
+        Se o arquivo tiver extensão .npz, a lista é salva em formato binário do NumPy;
+        caso contrário, é exportada como CSV legível, com ";" como caractere de separação.
         """
         if not self.lista_invertida:
             self.logger.warning("A lista invertida está vazia. Nenhum arquivo de saída será gerado.")
@@ -149,23 +192,62 @@ class GeradorListaInvertida:
                 self.logger.info(f"Criando diretório de saída: {diretorio_saida}")
                 os.makedirs(diretorio_saida)
 
-            with open(self.arquivo_escrita, 'w', newline='', encoding='utf-8') as f:
-                # O CSV usará ; como delimitador
-                writer = csv.writer(f, delimiter=';')
-                
-                # Escreve o cabeçalho
-                writer.writerow(['Palavra', 'Documentos'])
-                
-                # Escreve os dados da lista invertida, ordenando as palavras
-                for palavra, doc_ids in sorted(self.lista_invertida.items()):
-                    # A lista de documentos é salva como uma string no formato de lista Python
-                    writer.writerow([palavra.upper(), str(doc_ids)]) # Palavra em letras maiúsculas
+            if self.arquivo_escrita.lower().endswith('.npz'):
+                self._escrever_npz()
+            else:
+                self._escrever_csv()
             
             self.logger.info("Arquivo de saída gerado com sucesso.")
         except IOError as e:
             self.logger.error(f"Erro de I/O ao escrever o arquivo '{self.arquivo_escrita}': {e}")
             raise
 
+    def _postings_ordenados(self, palavra):
+        """
+        Converte os postings de uma palavra em arrays NumPy, sem cópia (np.frombuffer),
+        e os ordena pelo número do documento. Registros repetidos com o mesmo RECORDNUM
+        são tratados como um único documento, com as frequências somadas.
+
+        :return: Tupla (doc_ids, frequências) de arrays alinhados, sem documentos repetidos.
+        """
+        pares = np.frombuffer(self.lista_invertida[palavra], dtype=np.intc).reshape(-1, 2)
+        pares = pares[np.argsort(pares[:, 0], kind='stable')]
+        doc_ids, inicios = np.unique(pares[:, 0], return_index=True)
+        if doc_ids.size == len(pares):
+            return pares[:, 0], pares[:, 1]
+        return doc_ids, np.add.reduceat(pares[:, 1], inicios)
+
+    def _escrever_npz(self):
+        """
+        Salva a lista invertida como arrays NumPy alinhados, no mesmo layout de uma matriz CSR:
+        os postings da palavra i ocupam as posições indptr[i]:indptr[i+1] de documentos e frequencias.
+        """
+        palavras = sorted(self.lista_invertida)
+        postings = [self._postings_ordenados(palavra) for palavra in palavras]
+
+        np.savez(
+            self.arquivo_escrita,
+            palavras=np.array([palavra.upper() for palavra in palavras]), # Palavra em letras maiúsculas
+            documentos=np.concatenate([doc_ids for doc_ids, _ in postings]).astype(np.int32),
+            frequencias=np.concatenate([frequencias for _, frequencias in postings]).astype(np.int32),
+            indptr=np.cumsum([0] + [doc_ids.size for doc_ids, _ in postings], dtype=np.int64)
+        )
+
+    def _escrever_csv(self):
+        """Exporta a lista invertida em formato CSV, útil para inspeção manual."""
+        with open(self.arquivo_escrita, 'w', newline='', encoding='utf-8') as f:
+            # O CSV usará ; como delimitador
+            writer = csv.writer(f, delimiter=';')
+            
+            # Escreve o cabeçalho
+            writer.writerow(['Palavra', 'Documentos', 'Frequencias'])
+            
+            # Escreve os dados da lista invertida, ordenando as palavras e os documentos
+            for palavra in sorted(self.lista_invertida):
+                doc_ids, frequencias = (valores.tolist() for valores in self._postings_ordenados(palavra))
+                # Documentos e frequências são salvos como inteiros separados por espaço, alinhados por posição
+                writer.writerow([palavra.upper(), ' '.join(map(str, doc_ids)), ' '.join(map(str, frequencias))]) # Palavra em letras maiúsculas
+
     def executar(self):
         """
         Orquestra a execução completa do módulo, seguindo o princípio de processamento em batch.
@@ -187,6 +269,58 @@ class GeradorListaInvertida:
             self.logger.info(f"Pipeline concluído em {total_time:.2f} segundos.")
 
 
+def _processar_arquivo(caminho_arquivo):
+    """
+    Processa um único arquivo XML e monta a lista invertida parcial dos seus documentos.
+    Definida no nível do módulo para que possa ser executada por um ProcessPoolExecutor.
+
+    :param caminho_arquivo: Caminho do arquivo XML.
+    :return: Tupla (lista invertida parcial, total de documentos processados,
+             números dos documentos sem ABSTRACT nem EXTRACT).
+    """
+    lista_parcial = defaultdict(_novo_array_postings)
+    num_documentos = 0
+    docs_sem_texto = []
+
+    # iterparse percorre o arquivo em fluxo; cada RECORD é descartado logo após ser processado
+    for _, record in ET.iterparse(caminho_arquivo, events=('end',)):
+        if record.tag != 'RECORD':
+            continue
+
+        record_num_element = record.find('RECORDNUM')
+        if record_num_element is None:
+            record.clear()
+            continue
+        
+        record_num = int(record_num_element.text.strip())
+        
+        texto = ""
+        abstract_element = record.find('ABSTRACT')
+        if abstract_element is not None and abstract_element.text:
+            texto = abstract_element.text
+        else:
+            extract_element = record.find('EXTRACT') # Se não houver ABSTRACT, usa EXTRACT
+            if extract_element is not None and extract_element.text:
+                texto = extract_element.text
+            else:
+                docs_sem_texto.append(record_num)
+                record.clear()
+                continue # Pula para o próximo registro
+        
+        # O texto já foi extraído, então a subárvore do registro pode ser liberada
+        record.clear()
+
+        palavras_normalizadas = GeradorListaInvertida._normalizar_palavra(texto)
+        
+        # As ocorrências são contadas por documento, com uma única inserção por par (palavra, documento)
+        for palavra, frequencia in Counter(palavras_normalizadas).items():
+            lista_parcial[palavra].extend((record_num, frequencia))
+        
+        num_documentos += 1
+
+    return dict(lista_parcial), num_documentos, docs_sem_texto
+
+
 if __name__ == "__main__":
     # Ponto de entrada do script.
     # Cria uma instância da classe e chama o método principal de execução.
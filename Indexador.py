@@ -1,17 +1,22 @@
 import logging
 import csv
-import math
 import pickle
 import time
 import os
-import ast
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+from scipy.sparse import csr_matrix
 
 class Indexador:
     """
     Classe responsável por criar o modelo vetorial a partir de uma lista invertida.
     Calcula os pesos TF-IDF para cada termo em cada documento.
     """
+    # Número de termos por bloco no cálculo paralelo dos pesos
+    TAMANHO_BLOCO_TERMOS = 10000
+
     def __init__(self, config_path="INDEX.CFG"):
         """
         Inicializa o Indexador.
@@ -25,8 +30,9 @@ class Indexador:
         # Estruturas de dados para o modelo
         self.lista_invertida = {}
         self.documentos = set()
-        self.modelo = defaultdict(dict) # Dicionário aninhado para armazenar os pesos TF-IDF: {termo: {doc_id: peso}}
-        self.normas_documentos = defaultdict(float) # Armazena a norma euclidiana de cada vetor de documento
+        self.termo_para_linha = {} # Mapeia cada termo para sua linha na matriz TF-IDF
+        self.doc_ids = None # Array com o doc_id de cada coluna da matriz TF-IDF
+        self.modelo = None # Matriz esparsa CSR (termos x documentos) com os pesos TF-IDF
 
         # Configuração do logging
         self.logger = logging.getLogger('Indexador')
@@ -68,18 +74,20 @@ class Indexador:
             raise
 
     def _carregar_lista_invertida(self):
-        """Carrega o arquivo CSV da lista invertida em memória."""
+        """
+        Carrega a lista invertida em memória. Arquivos .npz (formato binário gerado pelo
+        GeradorListaInvertida) são lidos diretamente; os demais são lidos como CSV.
+        """
         self.logger.info(f"Carregando lista invertida de '{self.arquivo_leitura}'...")
         try:
-            with open(self.arquivo_leitura, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f, delimiter=';')
-                next(reader) # Pula o cabeçalho
-                for linha in reader:
-                    palavra, lista_docs_str = linha
-                    # ast.literal_eval converte a string '[1, 2, 2]' para uma lista Python [1, 2, 2]
-                    lista_docs = ast.literal_eval(lista_docs_str)
-                    self.lista_invertida[palavra] = lista_docs
-                    self.documentos.update(lista_docs)
+            if self.arquivo_leitura.lower().endswith('.npz'):
+                self._ler_npz()
+            else:
+                self._ler_csv()
+
+            # Cada termo ocupa uma linha e cada documento uma coluna da matriz TF-IDF
+            self.termo_para_linha = {palavra: linha for linha, palavra in enumerate(self.lista_invertida)}
+            self.doc_ids = np.array(sorted(self.documentos), dtype=np.int64)
             
             self.logger.info(f"Lista invertida carregada. Total de {len(self.lista_invertida)} palavras e {len(self.documentos)} documentos únicos.")
 
@@ -90,9 +98,70 @@ class Indexador:
             self.logger.error(f"Erro ao carregar ou processar a lista invertida: {e}")
             raise
 
+    def _ler_npz(self):
+        """Lê a lista invertida salva como arrays NumPy alinhados (palavras, documentos, frequencias, indptr)."""
+        with np.load(self.arquivo_leitura) as arquivo:
+            palavras = arquivo['palavras'].tolist()
+            documentos = arquivo['documentos']
+            frequencias = arquivo['frequencias']
+            indptr = arquivo['indptr']
+
+        # Os postings de cada palavra são fatias (views) dos arrays carregados, sem cópia
+        for i, palavra in enumerate(palavras):
+            inicio, fim = indptr[i], indptr[i + 1]
+            self.lista_invertida[palavra] = (documentos[inicio:fim], frequencias[inicio:fim])
+        self.documentos.update(np.unique(documentos).tolist())
+
+    def _ler_csv(self):
+        """Lê a lista invertida exportada em CSV, com documentos e frequências separados por espaço."""
+        with open(self.arquivo_leitura, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f, delimiter=';')
+            next(reader) # Pula o cabeçalho
+            for linha in reader:
+                palavra, lista_docs_str, frequencias_str = linha
+                # np.fromstring converte a string '1 5 9' diretamente para o array [1, 5, 9]
+                lista_docs = np.fromstring(lista_docs_str, dtype=np.int32, sep=' ')
+                frequencias = np.fromstring(frequencias_str, dtype=np.int32, sep=' ')
+                self.lista_invertida[palavra] = (lista_docs, frequencias)
+                self.documentos.update(lista_docs)
+
+    def _calcular_pesos_bloco(self, postings, num_total_documentos):
+        """
+        Calcula os pesos TF-IDF de um bloco de termos consecutivos.
+
+        :param postings: Lista de pares (documentos, frequências) de cada termo do bloco.
+        :param num_total_documentos: Número total de documentos da coleção.
+        :return: Tupla (pesos, colunas, número de documentos por termo, soma dos quadrados
+                 dos pesos por documento) referente apenas a este bloco.
+        """
+        data = []
+        indices = []
+        tamanhos = []
+        # Soma dos quadrados dos pesos de cada documento, acumulada no mesmo laço dos pesos
+        normas_quadradas = np.zeros(num_total_documentos)
+
+        for docs, frequencias in postings:
+            # A lista invertida já traz os documentos distintos que contêm o termo e a frequência
+            # do termo em cada um deles (f_ij), dispensando a recontagem
+            
+            # Cálculo do IDF (Inverse Document Frequency), com ni = número de documentos que contêm o termo i
+            idf = np.log10(num_total_documentos / docs.size)
+            
+            # Cálculo do TF (Term Frequency) com normalização logarítmica e do peso TF-IDF, para todos os documentos de uma vez
+            pesos = (1 + np.log10(frequencias)) * idf
+            colunas = np.searchsorted(self.doc_ids, docs)
+            np.add.at(normas_quadradas, colunas, pesos * pesos)
+
+            data.append(pesos)
+            indices.append(colunas)
+            tamanhos.append(docs.size)
+
+        return np.concatenate(data), np.concatenate(indices), np.array(tamanhos, dtype=np.int64), normas_quadradas
+
     def _calcular_pesos(self):
         """
-        Calcula os pesos TF-IDF para cada termo em cada documento e as normas dos vetores.
+        Calcula os pesos TF-IDF para cada termo em cada documento e normaliza os vetores.
+        Os pesos são armazenados em uma matriz esparsa CSR de formato (termos x documentos).
         """
         self.logger.info("Iniciando cálculo dos pesos TF-IDF...")
         
@@ -101,44 +170,47 @@ class Indexador:
             self.logger.warning("Nenhum documento encontrado. O cálculo de pesos será pulado.")
             return
 
-        for palavra, lista_docs in self.lista_invertida.items():
-            # ni: número de documentos que contêm o termo i
-            num_docs_com_palavra = len(set(lista_docs))
-            
-            # Cálculo do IDF (Inverse Document Frequency)
-            idf = math.log10(num_total_documentos / num_docs_com_palavra)
-            
-            # Contagem da frequência do termo em cada documento (f_ij)
-            frequencia_termo_doc = defaultdict(int)
-            for doc_id in lista_docs:
-                frequencia_termo_doc[doc_id] += 1
-
-            for doc_id, freq in frequencia_termo_doc.items():
-                # Cálculo do TF (Term Frequency) com normalização logarítmica
-                tf = 1 + math.log10(freq)
-                
-                # Cálculo do peso TF-IDF
-                peso_tfidf = tf * idf
-                
-                # Armazena o peso no modelo
-                self.modelo[palavra][doc_id] = peso_tfidf
+        # Os termos são divididos em blocos de TAMANHO_BLOCO_TERMOS. Um vocabulário que cabe em um
+        # único bloco é calculado diretamente, sem o custo do pool de threads; os demais blocos são
+        # distribuídos entre threads, e map preserva a ordem dos blocos (linhas da matriz).
+        postings = list(self.lista_invertida.values())
+        blocos = [postings[i:i + self.TAMANHO_BLOCO_TERMOS] for i in range(0, len(postings), self.TAMANHO_BLOCO_TERMOS)]
+        if len(blocos) == 1:
+            resultados = [self._calcular_pesos_bloco(blocos[0], num_total_documentos)]
+        else:
+            with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                resultados = list(executor.map(partial(self._calcular_pesos_bloco, num_total_documentos=num_total_documentos), blocos))
+
+        data_blocos, indices_blocos, tamanhos_blocos, normas_blocos = zip(*resultados)
+
+        # Vetores que compõem a matriz CSR: pesos, colunas (documentos) e início de cada linha (termo)
+        data = np.concatenate(data_blocos)
+        indices = np.concatenate(indices_blocos).astype(np.int32)
+        indptr = np.concatenate([[0], np.cumsum(np.concatenate(tamanhos_blocos))]).astype(np.int64)
+        # Soma dos quadrados dos pesos de cada documento, combinando o acumulado de cada bloco
+        normas_quadradas = np.sum(normas_blocos, axis=0)
 
         self.logger.info("Cálculo dos pesos TF-IDF concluído.")
-        self.logger.info("Iniciando cálculo das normas dos vetores dos documentos...")
+        self.logger.info("Iniciando normalização dos vetores dos documentos...")
 
-        # Cálculo da norma de cada vetor de documento para uso na similaridade de cosseno
-        for palavra in self.modelo:
-            for doc_id, peso in self.modelo[palavra].items():
-                self.normas_documentos[doc_id] += peso ** 2
-        
-        for doc_id in self.normas_documentos:
-            self.normas_documentos[doc_id] = math.sqrt(self.normas_documentos[doc_id])
+        # Cada coluna (vetor de documento) é dividida pela sua norma euclidiana. Com vetores unitários,
+        # a similaridade de cosseno na busca se reduz ao produto escalar dividido pela norma da consulta.
+        normas = np.sqrt(normas_quadradas)
+        inversos = np.divide(1.0, normas, out=np.zeros_like(normas), where=normas > 0)
+        data *= inversos[indices]
+
+        # Os pesos são calculados em float64 e armazenados em float32 (pesos normalizados cabem com folga
+        # na precisão simples); com índices int32, cada elemento não nulo ocupa 8 bytes em vez de 12
+        self.modelo = csr_matrix(
+            (data.astype(np.float32), indices, indptr),
+            shape=(len(self.termo_para_linha), num_total_documentos)
+        )
 
-        self.logger.info("Cálculo das normas concluído.")
+        self.logger.info("Normalização dos vetores concluída.")
 
     def _salvar_modelo(self):
         """Salva a estrutura de dados do modelo em um arquivo usando pickle."""
-        if not self.modelo:
+        if self.modelo is None or self.modelo.nnz == 0:
             self.logger.warning("O modelo está vazio. Nenhum arquivo será salvo.")
             return
 
@@ -151,14 +223,17 @@ class Indexador:
                 self.logger.info(f"Criando diretório de saída: {diretorio_saida}")
                 os.makedirs(diretorio_saida)
 
-            # O objeto a ser salvo contém o modelo TF-IDF e as normas
+            # O objeto a ser salvo contém a matriz TF-IDF normalizada e o mapeamento de termos e documentos
             modelo_completo = {
                 'modelo_tfidf': self.modelo,
-                'normas_documentos': self.normas_documentos
+                'termo_para_linha': self.termo_para_linha,
+                'doc_ids': self.doc_ids
             }
 
-            with open(self.arquivo_escrita, 'wb') as f:
-                pickle.dump(modelo_completo, f)
+            # Buffer de 1 MiB e o protocolo mais recente do pickle (5), que serializa os arrays
+            # NumPy da matriz CSR (data, indices, indptr) como blocos binários contíguos
+            with open(self.arquivo_escrita, 'wb', buffering=1 << 20) as f:
+                pickle.dump(modelo_completo, f, protocol=pickle.HIGHEST_PROTOCOL)
             
             self.logger.info("Modelo salvo com sucesso.")
         except Exception as e:
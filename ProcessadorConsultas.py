@@ -1,17 +1,96 @@
-import xml.etree.ElementTree as ET
 import unicodedata
 import logging
 import re
-import csv
 import time
 import os
-from collections import defaultdict
+from collections import defaultdict, Counter
+from functools import lru_cache
+from operator import itemgetter
+
+# lxml (libxml2) é usado quando disponível; caso contrário, o ElementTree da biblioteca padrão,
+# que oferece o mesmo iterparse, porém sem o filtro por tag nem a navegação entre irmãos
+try:
+    from lxml import etree
+    _LXML_DISPONIVEL = True
+except ImportError:
+    import xml.etree.ElementTree as etree
+    _LXML_DISPONIVEL = False
+
+# Sequências de caracteres que não são letras minúsculas nem espaços, compiladas uma única vez
+_RE_NAO_ALFA = re.compile(r'[^a-z\s]+')
+
+# Instruções "CHAVE=VALOR" do PC.CFG, uma por linha. Só espaços e tabulações são ignorados ao redor
+# da chave e do valor, para que um valor vazio nunca avance sobre a instrução da linha seguinte
+_RE_INSTRUCAO_CONFIG = re.compile(r'(?im)^[ \t]*(LEIA|CONSULTAS|ESPERADOS)[ \t]*=[ \t]*(.*?)[ \t\r]*$')
+
+# Os caracteres abaixo deste código (ASCII e alfabetos latinos estendidos) são normalizados pela tabela
+_LIMITE_TABELA = 0x250
+
+def _construir_tabela_normalizacao():
+    """
+    Monta a tabela de tradução que aplica, caractere a caractere, a normalização completa:
+    remove acentos (NFD + descarte das marcas 'Mn'), mantém letras de a-z e espaços,
+    apaga todos os demais símbolos e já converte as letras para maiúsculas, conforme
+    especificado para a saída. Caracteres que não mudam ficam fora da tabela.
+    """
+    tabela = {}
+    for codigo in range(_LIMITE_TABELA):
+        # As marcas 'Mn' não são letras de a-z, então o próprio filtro já as descarta
+        decomposto = unicodedata.normalize('NFD', chr(codigo))
+        mantidos = ''.join(c for c in decomposto if 'a' <= c <= 'z' or c.isspace()).upper()
+        if mantidos != chr(codigo):
+            tabela[codigo] = mantidos or None
+    return tabela
+
+_TABELA_NORMALIZACAO = _construir_tabela_normalizacao()
+
+# Versão em bytes da mesma normalização para textos inteiramente ASCII: converte a-z para
+# maiúsculas e apaga, com bytes.translate, tudo o que não é letra nem espaço
+_TABELA_ASCII = bytes.maketrans(b'abcdefghijklmnopqrstuvwxyz', b'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+_REMOVER_ASCII = bytes(codigo for codigo in range(128) if _TABELA_NORMALIZACAO.get(codigo, chr(codigo)) is None)
+
+@lru_cache(maxsize=1 << 16)
+def _normalizar_token(token):
+    """
+    Normaliza um único token (já em minúsculas e sem espaços). O resultado é memorizado,
+    pois as mesmas palavras se repetem muito entre as consultas.
+
+    :return: O token sem acentos e sem símbolos, em letras maiúsculas; pode ser vazio se só houver símbolos.
+    """
+    if max(token) < chr(_LIMITE_TABELA):
+        # Remove acentos, pontuação e outros símbolos e converte para maiúsculas em uma única passada
+        return token.translate(_TABELA_NORMALIZACAO)
+    # Token com caracteres fora da tabela: a NFD separa os acentos em marcas 'Mn', que a
+    # regex remove junto com os demais símbolos, mantendo apenas letras, sem laço por caractere
+    # em Python. Com o '+', cada sequência é removida de uma vez.
+    return _RE_NAO_ALFA.sub('', unicodedata.normalize('NFD', token)).upper()
+
+def _itens_em_ordem(dicionario):
+    """
+    Devolve os itens do dicionário ordenados pela chave, evitando a ordenação quando
+    as chaves já foram inseridas em ordem crescente (o caso comum no cfquery.xml).
+
+    :param dicionario: Dicionário com chaves comparáveis.
+    :return: Sequência de pares (chave, valor) em ordem crescente de chave.
+    """
+    chaves = list(dicionario)
+    if all(anterior < atual for anterior, atual in zip(chaves, chaves[1:])):
+        return dicionario.items()
+    return sorted(dicionario.items())
+
 
 class ProcessadorConsultas:
     """
     Classe responsável por processar o arquivo de consultas em formato XML.
     Gera um arquivo com as consultas processadas e outro com os resultados esperados.
     """
+    # Atributo preenchido por cada instrução do arquivo de configuração
+    _ATRIBUTOS_CONFIG = {
+        'LEIA': 'arquivo_leitura',
+        'CONSULTAS': 'arquivo_consultas',
+        'ESPERADOS': 'arquivo_esperados'
+    }
+
     def __init__(self, config_path="PC.CFG"):
         """
         Inicializa o Processador de Consultas.
@@ -23,8 +102,8 @@ class ProcessadorConsultas:
         self.arquivo_consultas = ""
         self.arquivo_esperados = ""
         
-        self.consultas_processadas = {}
-        self.resultados_esperados = defaultdict(list)
+        self.consultas_processadas = [] # Pares (número da consulta, texto), em ordem crescente de número
+        self.resultados_esperados = defaultdict(Counter) # Votos de cada documento por consulta: {query: {doc: votos}}
 
         # Configuração do logging
         self.logger = logging.getLogger('ProcessadorConsultas')
@@ -42,24 +121,20 @@ class ProcessadorConsultas:
         self.logger.info(f"Lendo arquivo de configuração: {self.config_path}")
         try:
             with open(self.config_path, 'r', encoding='utf-8') as f:
-                for linha in f:
-                    linha = linha.strip()
-                    if not linha:
-                        continue
-                    chave, valor = linha.split('=', 1)
-                    if chave.upper() == 'LEIA':
-                        self.arquivo_leitura = valor
-                    elif chave.upper() == 'CONSULTAS':
-                        self.arquivo_consultas = valor
-                    elif chave.upper() == 'ESPERADOS':
-                        self.arquivo_esperados = valor
+                conteudo = f.read()
+
+            # Uma única varredura do arquivo encontra todas as instruções "CHAVE=VALOR"
+            for chave, valor in _RE_INSTRUCAO_CONFIG.findall(conteudo):
+                setattr(self, self._ATRIBUTOS_CONFIG[chave.upper()], valor)
             
             if not all([self.arquivo_leitura, self.arquivo_consultas, self.arquivo_esperados]):
                 raise ValueError("Arquivo de configuração incompleto. Instruções LEIA, CONSULTAS e ESPERADOS são obrigatórias.")
 
-            self.logger.info(f"Arquivo de consultas a ser lido: {self.arquivo_leitura}")
-            self.logger.info(f"Arquivo de saída para consultas processadas: {self.arquivo_consultas}")
-            self.logger.info(f"Arquivo de saída para resultados esperados: {self.arquivo_esperados}")
+            # Um único registro resume a configuração lida
+            self.logger.info(
+                f"Configuração lida: consultas em '{self.arquivo_leitura}', saída em "
+                f"'{self.arquivo_consultas}' e '{self.arquivo_esperados}'."
+            )
 
         except FileNotFoundError:
             self.logger.error(f"Arquivo de configuração '{self.config_path}' não encontrado.")
@@ -68,17 +143,72 @@ class ProcessadorConsultas:
             self.logger.error(f"Erro ao ler arquivo de configuração: {e}")
             raise
 
-    def _normalizar_texto(self, texto):
+    def _normalizar_textos(self, textos):
+        """
+        Normaliza, em lote, os textos das consultas usando as mesmas regras dos módulos
+        anteriores para garantir consistência.
+
+        :param textos: Lista com o texto original de cada consulta.
+        :return: Lista com os textos normalizados, em letras maiúsculas, na mesma ordem.
+        """
+        # Todos os textos são convertidos para minúsculas em uma única chamada; o separador
+        # '\0' não pode ocorrer em XML e não é alterado por lower()
+        textos_minusculos = '\0'.join(textos).lower().split('\0')
+        return [
+            self._normalizar_texto_ascii(texto) if texto.isascii()
+            # Quebra cada texto nos espaços e normaliza cada token pelo cache; tokens que ficam
+            # vazios (apenas símbolos) são descartados, o que também remove os espaços extras
+            else ' '.join(filter(None, map(_normalizar_token, texto.split())))
+            for texto in textos_minusculos
+        ]
+
+    @staticmethod
+    def _normalizar_texto_ascii(texto):
+        """
+        Normaliza um texto ASCII (já em minúsculas) de uma vez, em C, com bytes.translate,
+        sem quebrá-lo em tokens.
+
+        :return: O texto normalizado, em letras maiúsculas e com espaços simples.
+        """
+        limpo = texto.encode('ascii').translate(_TABELA_ASCII, _REMOVER_ASCII).decode('ascii')
+        return ' '.join(limpo.split())
+
+    def _iterar_consultas(self):
         """
-        Normaliza o texto da consulta usando as mesmas regras dos módulos anteriores
-        para garantir consistência.
+        Percorre o arquivo de consultas em fluxo com iterparse, entregando cada elemento QUERY
+        assim que ele termina de ser lido, sem construir a árvore do arquivo inteiro em memória.
+        Cada consulta é liberada depois de processada.
         """
-        # Converte para minúsculas e remove acentos
-        texto_sem_acentos = ''.join(c for c in unicodedata.normalize('NFD', texto.lower()) if unicodedata.category(c) != 'Mn')
-        # Remove caracteres de pontuação e outros símbolos, mantendo apenas letras e espaços
-        texto_limpo = re.sub(r'[^a-z\s]', '', texto_sem_acentos)
-        # Remove espaços extras
-        return ' '.join(texto_limpo.split())
+        if _LXML_DISPONIVEL:
+            for _, query_element in etree.iterparse(self.arquivo_leitura, events=('end',), tag='QUERY'):
+                yield query_element
+                # Libera a consulta processada e as anteriores já descartadas pela árvore
+                query_element.clear()
+                while query_element.getprevious() is not None:
+                    del query_element.getparent()[0]
+        else:
+            for _, elemento in etree.iterparse(self.arquivo_leitura, events=('end',)):
+                if elemento.tag != 'QUERY':
+                    continue
+                yield elemento
+                elemento.clear()
+
+    @staticmethod
+    def _extrair_docs_votados(query_element):
+        """
+        Extrai, em lote, os documentos que receberam voto em uma consulta. Considera qualquer
+        score > 0 como um voto.
+
+        :param query_element: Elemento QUERY do arquivo de consultas.
+        :return: Lista com o número de cada documento votado.
+        """
+        # Uma única list comprehension filtra e converte os itens, sem as chamadas a append do laço;
+        # itens sem número de documento (texto ausente ou só com espaços) não recebem voto
+        return [
+            int(item_element.text)
+            for item_element in query_element.iterfind('Records/Item')
+            if int(item_element.get('score') or 0) > 0 and (item_element.text or '').strip()
+        ]
 
     def _processar_arquivo_consultas(self):
         """
@@ -86,31 +216,35 @@ class ProcessadorConsultas:
         """
         self.logger.info(f"Iniciando processamento do arquivo de consultas: {self.arquivo_leitura}")
         try:
-            tree = ET.parse(self.arquivo_leitura)
-            root = tree.getroot()
-            
-            num_consultas_lidas = 0
-            for query_element in root.findall('QUERY'):
-                num_consultas_lidas += 1
-                query_number = int(query_element.find('QueryNumber').text.strip())
-                query_text = query_element.find('QueryText').text.strip()
+            # Os textos são coletados durante a leitura e normalizados todos juntos ao final
+            query_numbers = []
+            query_texts = []
+            for query_element in self._iterar_consultas():
+                # findtext devolve o default quando a tag não existe, evitando o acesso a .text de None
+                query_number_texto = query_element.findtext('QueryNumber', default='').strip()
+                if not query_number_texto:
+                    self.logger.warning("Consulta sem QueryNumber encontrada; ignorando.")
+                    continue
+                query_number = int(query_number_texto)
+                query_numbers.append(query_number)
+                query_texts.append(query_element.findtext('QueryText', default='').strip())
                 
-                # Processa e armazena a consulta
-                consulta_normalizada = self._normalizar_texto(query_text)
-                self.consultas_processadas[query_number] = consulta_normalizada.upper() # Conforme especificado: letras maiúsculas
-                
-                # Processa e armazena os resultados esperados
-                records_element = query_element.find('Records')
-                if records_element is not None:
-                    for item_element in records_element.findall('Item'):
-                        score = int(item_element.get('score'))
-                        if score > 0: # Considera qualquer score > 0 como um voto
-                            doc_number = int(item_element.text.strip())
-                            self.resultados_esperados[query_number].append(doc_number)
-
-            self.logger.info(f"Total de {num_consultas_lidas} consultas lidas e processadas.")
-
-        except ET.ParseError as e:
+                # Processa e armazena os resultados esperados (consultas sem Records não recebem votos).
+                # Os votos da consulta são contados de uma só vez pelo Counter, cuja contagem é feita em C
+                docs_votados = self._extrair_docs_votados(query_element)
+                if docs_votados:
+                    self.resultados_esperados[query_number].update(docs_votados)
+
+            # Processa e armazena as consultas, já em letras maiúsculas conforme especificado
+            self.consultas_processadas.extend(zip(query_numbers, self._normalizar_textos(query_texts)))
+            # As consultas do cfquery.xml já vêm em ordem crescente e sem repetição; caso contrário,
+            # os números repetidos ficam com o último texto lido e a lista é ordenada uma única vez
+            if any(anterior >= atual for anterior, atual in zip(query_numbers, query_numbers[1:])):
+                self.consultas_processadas = sorted(dict(self.consultas_processadas).items(), key=itemgetter(0))
+
+            self.logger.info(f"Total de {len(query_numbers)} consultas lidas e processadas.")
+
+        except etree.ParseError as e:
             self.logger.error(f"Erro de parsing no XML '{self.arquivo_leitura}': {e}")
             raise
         except Exception as e:
@@ -123,22 +257,22 @@ class ProcessadorConsultas:
         """
         self.logger.info("Iniciando escrita dos arquivos de saída.")
         
-        # Garante que o diretório de saída exista para ambos os arquivos
-        for path in [self.arquivo_consultas, self.arquivo_esperados]:
+        # Garante que o diretório de saída exista para ambos os arquivos; exist_ok dispensa a
+        # verificação prévia com os.path.exists
+        for path in (self.arquivo_consultas, self.arquivo_esperados):
             diretorio_saida = os.path.dirname(path)
-            if diretorio_saida and not os.path.exists(diretorio_saida):
-                self.logger.info(f"Criando diretório de saída: {diretorio_saida}")
-                os.makedirs(diretorio_saida)
+            if diretorio_saida:
+                os.makedirs(diretorio_saida, exist_ok=True)
 
-        # Escreve o arquivo de consultas processadas
+        # Escreve o arquivo de consultas processadas; o CSV é montado em memória e gravado
+        # em disco com uma única escrita. Os campos nunca precisam de aspas (números e texto
+        # só com letras e espaços), então as linhas são formatadas diretamente, sem o csv.writer,
+        # mantendo o terminador '\r\n' que ele usava
         try:
+            # Elimina ponto e vírgula do texto para não quebrar o CSV
+            linhas = [f"{num};{texto.replace(';', '')}\r\n" for num, texto in self.consultas_processadas]
             with open(self.arquivo_consultas, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f, delimiter=';')
-                writer.writerow(['QueryNumber', 'QueryText'])
-                for num, texto in sorted(self.consultas_processadas.items()):
-                    # Elimina ponto e vírgula do texto para não quebrar o CSV
-                    texto_sem_ponto_virgula = texto.replace(';', '')
-                    writer.writerow([num, texto_sem_ponto_virgula])
+                f.write('QueryNumber;QueryText\r\n' + ''.join(linhas))
             self.logger.info(f"Arquivo de consultas processadas salvo em '{self.arquivo_consultas}'.")
         except IOError as e:
             self.logger.error(f"Erro ao escrever o arquivo de consultas: {e}")
@@ -146,17 +280,15 @@ class ProcessadorConsultas:
 
         # Escreve o arquivo de resultados esperados
         try:
+            # Os votos de cada documento já foram contados durante o processamento; consultas e
+            # documentos só são ordenados quando não chegaram em ordem crescente do XML
+            linhas = [
+                f"{query_num};{doc_num};{votes}\r\n"
+                for query_num, doc_votes in _itens_em_ordem(self.resultados_esperados)
+                for doc_num, votes in _itens_em_ordem(doc_votes)
+            ]
             with open(self.arquivo_esperados, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f, delimiter=';')
-                writer.writerow(['QueryNumber', 'DocNumber', 'DocVotes'])
-                for query_num, doc_list in sorted(self.resultados_esperados.items()):
-                    # Conta os votos para cada documento
-                    doc_votes = defaultdict(int)
-                    for doc_id in doc_list:
-                        doc_votes[doc_id] += 1
-                    
-                    for doc_num, votes in sorted(doc_votes.items()):
-                        writer.writerow([query_num, doc_num, votes])
+                f.write('QueryNumber;DocNumber;DocVotes\r\n' + ''.join(linhas))
             self.logger.info(f"Arquivo de resultados esperados salvo em '{self.arquivo_esperados}'.")
         except IOError as e:
             self.logger.error(f"Erro ao escrever o arquivo de esperados: {e}")